@@ -1,4 +1,2 @@
 from nlplot.nlplot import *
-
-def main():
-    pass
+from nlplot.cli import main
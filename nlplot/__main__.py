@@ -0,0 +1,5 @@
+import sys
+
+from nlplot.cli import main
+
+sys.exit(main())
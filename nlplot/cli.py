@@ -0,0 +1,191 @@
+"""Command line interface to run nlplot as a batch job without a notebook"""
+
+import os
+import time
+import argparse
+import multiprocessing
+from contextlib import contextmanager
+
+import pandas as pd
+
+from nlplot.nlplot import NLPlot, load_corpus, export_report, _bar_ngram_figure, _get_n_jobs
+
+ANALYSES = ['ngram', 'histogram', 'network', 'lda', 'wordcloud']
+DEFAULT_ANALYSES = ['ngram', 'histogram', 'network', 'lda']
+
+# NLPlot shared with the n-gram workers (set by the pool initializer)
+_worker_nlplot = None
+
+
+def read_corpus(path, taget_col):
+    """Read a corpus file
+
+    Args:
+        path (str): csv, tsv, parquet, pickle or jsonl file, a text file with one document per line,
+                    or a corpus directory written by nlplot.save_corpus
+        taget_col (str): Column to be analyzed
+
+    Returns:
+            pd.DataFrame or TokenCorpus: input of NLPlot
+
+    """
+    if os.path.isdir(path):
+        return load_corpus(path)
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return pd.read_csv(path)
+    if ext == '.tsv':
+        return pd.read_csv(path, sep='\t')
+    if ext == '.parquet':
+        return pd.read_parquet(path)
+    if ext in ('.pkl', '.pickle'):
+        return pd.read_pickle(path)
+    if ext == '.jsonl':
+        return pd.read_json(path, lines=True)
+
+    with open(path, encoding='utf-8') as f:
+        return pd.DataFrame({taget_col: f.read().splitlines()})
+
+
+@contextmanager
+def stage(name, timings):
+    """Measure the elapsed time of a stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # a failing stage is reported too
+        timings[name] = time.perf_counter() - start
+        print('[{}] {:.2f}s'.format(name, timings[name]))
+
+
+def _init_worker(npt):
+    global _worker_nlplot
+    _worker_nlplot = npt
+
+
+def _bar_ngram_worker(kwargs):
+    """Count the n-grams and plot the bar chart in a worker process"""
+    kwargs = dict(kwargs)
+    title = kwargs.pop('title')
+    table = _worker_nlplot.ngram_freq(**kwargs)
+    return _bar_ngram_figure(table, title=title), table
+
+
+def run(args) -> dict:
+    """Run the analyses and save the figures and tables
+
+    Args:
+        args (argparse.Namespace): parsed command line arguments
+
+    Returns:
+            dict: elapsed seconds of each stage
+
+    """
+    timings = {}
+    figures = {}
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    n_jobs = _get_n_jobs(args.n_jobs)
+
+    try:
+        with stage('load', timings):
+            data = read_corpus(args.input, args.column)
+
+        # shared preprocessing: tokenizing and stop words are computed once for all the analyses
+        with stage('preprocess', timings):
+            npt = NLPlot(data, taget_col=args.column, output_file_path=os.path.join(output_dir, ''),
+                         default_stopwords_file_path=args.stopwords_file)
+            stopwords = []
+            if args.stopword_top_n > 0 or args.stopword_min_freq > 0:
+                stopwords = npt.get_stopword(top_n=args.stopword_top_n, min_freq=args.stopword_min_freq)
+
+        if 'ngram' in args.analyses:
+            with stage('ngram', timings):
+                tasks = [dict(title='{}-gram'.format(n), ngram=n, top_n=args.top_n, stopwords=list(stopwords),
+                              verbose=False, sample=args.sample, random_state=args.random_state)
+                         for n in args.ngram]
+                if n_jobs == 1 or len(tasks) == 1:
+                    _init_worker(npt)
+                    results = [_bar_ngram_worker(task) for task in tasks]
+                else:
+                    with multiprocessing.Pool(min(n_jobs, len(tasks)), _init_worker, (npt,)) as pool:
+                        results = pool.map(_bar_ngram_worker, tasks)
+                for task, (fig, table) in zip(tasks, results):
+                    figures[task['title']] = fig
+                    table.to_csv(os.path.join(output_dir, task['title'] + '.csv'), index=False)
+
+        if 'histogram' in args.analyses:
+            with stage('histogram', timings):
+                figures['word_distribution'] = npt.word_distribution(title='number of words distribution')
+                npt.df[args.column + '_length'].describe().to_csv(os.path.join(output_dir, 'word_distribution.csv'))
+
+        if 'network' in args.analyses:
+            with stage('network', timings):
+                npt.build_graph(stopwords=list(stopwords), min_edge_frequency=args.min_edge_frequency,
+                                n_jobs=n_jobs, sample=args.sample, random_state=args.random_state)
+                npt.node_df.to_csv(os.path.join(output_dir, 'node_df.csv'), index=False)
+                npt.edge_df.to_csv(os.path.join(output_dir, 'edge_df.csv'), index=False)
+                if len(npt.node_df) > 0:
+                    figures['co_network'] = npt.co_network(title='Co-occurrence network', show=False)
+                    figures['sunburst'] = npt.sunburst(title='sunburst chart', colorscale=True)
+
+        if 'lda' in args.analyses:
+            with stage('lda', timings):
+                vis = npt.ldavis(num_topics=args.num_topics, passes=args.passes)
+                figures['ldavis'] = vis
+                vis.topic_info.to_csv(os.path.join(output_dir, 'ldavis_topic_info.csv'), index=False)
+
+        if 'wordcloud' in args.analyses:
+            with stage('wordcloud', timings):
+                figures['wordcloud'] = npt.wordcloud(stopwords=list(stopwords), show=False,
+                                                     sample=args.sample, random_state=args.random_state)
+
+        with stage('export', timings):
+            export_report(figures, output_dir, single_file=args.single_file, n_jobs=n_jobs)
+    finally:
+        # the timings are saved even if a stage fails
+        pd.DataFrame({'stage': list(timings), 'seconds': list(timings.values())}) \
+            .to_csv(os.path.join(output_dir, 'timings.csv'), index=False)
+        print('total: {:.2f}s'.format(sum(timings.values())))
+    return timings
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(prog='nlplot', description='Visualization Module for Natural Language Processing')
+    parser.add_argument('input', help='csv, tsv, parquet, pickle, jsonl, text file (one document per line) '
+                                      'or a corpus directory written by nlplot.save_corpus')
+    parser.add_argument('-c', '--column', default='text', help='column to be analyzed')
+    parser.add_argument('-o', '--output-dir', default='./nlplot_output', help='directory to save figures and tables')
+    parser.add_argument('-a', '--analyses', nargs='+', choices=ANALYSES, default=DEFAULT_ANALYSES,
+                        help='analyses to run')
+    parser.add_argument('--ngram', nargs='+', type=int, default=[1, 2], help='N of the n-gram bar charts')
+    parser.add_argument('--top-n', type=int, default=50, help='how many words should be output')
+    parser.add_argument('--stopwords-file', default='', help='file that defines the default stopwords')
+    parser.add_argument('--stopword-top-n', type=int, default=0,
+                        help='exclude the N most frequent words as stopwords')
+    parser.add_argument('--stopword-min-freq', type=int, default=0,
+                        help='exclude the words occurring at most this number of times as stopwords')
+    parser.add_argument('--min-edge-frequency', type=int, default=10,
+                        help='minimum number of edge occurrences of the co-occurrence network')
+    parser.add_argument('--num-topics', type=int, default=5, help='number of LDA topics')
+    parser.add_argument('--passes', type=int, default=5, help='number of LDA passes')
+    parser.add_argument('--sample', type=float, default=None,
+                        help='sample this number of documents (or this fraction if below 1) for a fast preview')
+    parser.add_argument('--random-state', type=int, default=0, help='seed of the sampling')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='number of worker processes, -1 means all processors')
+    parser.add_argument('--single-file', action='store_true', help='write all the figures into one HTML file')
+    args = parser.parse_args(argv)
+
+    # sample_positions treats a float as a fraction and an int as a number of documents
+    if args.sample is not None and args.sample >= 1:
+        args.sample = int(args.sample)
+    return args
+
+
+def main(argv=None) -> int:
+    """Entry point of the nlplot command"""
+    run(parse_args(argv))
+    return 0
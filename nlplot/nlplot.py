@@ -1,13 +1,18 @@
 """Visualization Module for Natural Language Processing"""
 
 import os
+import re
 import gc
+import html
+import base64
 import pandas as pd
 import numpy as np
 import itertools
 import multiprocessing
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+from scipy import stats
 from sklearn import preprocessing
 import datetime as datetime
 import itertools
@@ -17,21 +22,33 @@ warnings.simplefilter('ignore')
 
 import gensim
 import pyLDAvis.gensim
-pyLDAvis.enable_notebook()
+try:
+    # get_ipython is only defined in IPython sessions, skip it in scripts and batch jobs
+    get_ipython()
+    pyLDAvis.enable_notebook()
+except NameError:
+    pass
 
 import seaborn as sns
 import plotly
+import plotly.io as pio
 import plotly.graph_objs as go
 import plotly.express as px
 from plotly.offline import iplot
 from wordcloud import WordCloud
-import IPython.display
 from io import BytesIO
 from PIL import Image
 import networkx as nx
 from networkx.algorithms import community
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
 TTF_FILE_NAME = str(os.path.dirname(__file__)) + '/data/mplus-1c-regular.ttf'
+PLOTLYJS_FILE_NAME = 'plotly.min.js'
 
 
 def get_colorpalette(colorpalette, n_colors) -> list:
@@ -65,21 +82,14 @@ def freq_df(df_value, n_gram=1, n=50, stopwords=[], verbose=True):
 
     """
 
-    def generate_ngrams(text, n_gram=1):
-        """Function to create a list of n-grams"""
-        token = [token for token in text.lower().split(" ")
-                 if token != "" if token not in stopwords]
-        ngrams = zip(*[token[i:] for i in range(n_gram)])
-        return [" ".join(ngram) for ngram in ngrams]
-
     freq_dict = defaultdict(int)
     if verbose:
         for sent in tqdm(df_value):
-            for word in generate_ngrams(str(sent), n_gram=n_gram):
+            for word in _generate_ngrams(str(sent), n_gram=n_gram, stopwords=stopwords):
                 freq_dict[word] += 1
     else:
         for sent in df_value:
-            for word in generate_ngrams(str(sent), n_gram=n_gram):
+            for word in _generate_ngrams(str(sent), n_gram=n_gram, stopwords=stopwords):
                 freq_dict[word] += 1
 
     fd_sorted = pd.DataFrame(sorted(freq_dict.items(),
@@ -88,11 +98,538 @@ def freq_df(df_value, n_gram=1, n=50, stopwords=[], verbose=True):
     return fd_sorted.head(n)
 
 
+def _generate_ngrams(text, n_gram=1, stopwords=[]):
+    """Function to create a list of n-grams"""
+    token = [token for token in text.lower().split(" ")
+             if token != "" if token not in stopwords]
+    ngrams = zip(*[token[i:] for i in range(n_gram)])
+    return [" ".join(ngram) for ngram in ngrams]
+
+
+def sample_positions(n_docs, sample, random_state=0, strata=None) -> np.ndarray:
+    """Draw a reproducible random sample of documents
+
+    With strata, each stratum is sampled in proportion to its size (at least one document).
+    Missing labels (NaN) form a stratum of their own.
+
+    Args:
+        n_docs (int): Number of documents in the corpus
+        sample (int or float): Number of documents to sample, or the fraction if it is a float
+        random_state (int): Seed of the random number generator
+        strata (np.ndarray): Stratum label of each document
+
+    Returns:
+            np.ndarray: Sorted positions of the sampled documents
+
+    """
+    if not sample > 0:
+        raise ValueError('sample must be greater than 0, got {}'.format(sample))
+    fraction = sample if isinstance(sample, float) else sample / max(n_docs, 1)
+    fraction = min(fraction, 1.0)
+    rng = np.random.RandomState(random_state)
+
+    if strata is None:
+        size = min(int(round(n_docs * fraction)), n_docs)
+        positions = rng.choice(n_docs, size=size, replace=False)
+    else:
+        # NaN labels are factorized to -1
+        codes, _ = pd.factorize(np.asarray(strata))
+        positions = []
+        for code in np.unique(codes):
+            members = np.flatnonzero(codes == code)
+            size = min(max(int(round(len(members) * fraction)), 1), len(members))
+            positions.append(rng.choice(members, size=size, replace=False))
+        positions = np.concatenate(positions) if positions else np.array([], dtype=int)
+
+    if len(positions) == 0:
+        raise ValueError('sample={} selects no documents out of {}'.format(sample, n_docs))
+    return np.sort(positions)
+
+
+def sample_freq_df(df_value, sample_strata, population_sizes, n_gram=1, n=50,
+                   stopwords=[], verbose=True, confidence=0.95) -> pd.DataFrame:
+    """Create a data frame of frequent word of a sample, scaled back to the corpus size
+
+    The totals are estimated by the (stratified) expansion estimator over documents,
+    and the confidence intervals use its normal approximation with the finite population correction.
+    The documents are read in one pass, keeping only the sum and the sum of squares
+    of the per-document counts of each word in each stratum.
+
+    Args:
+        df_value (pd.Series): Separated by space values of the sampled documents
+        sample_strata (np.ndarray): Stratum label of each sampled document
+        population_sizes (dict): Number of documents in the corpus for each stratum label
+        n_gram (int): N number of N grams
+        n (int): How many words should be output
+        stopwords (list): A list of words to specify for the stopword
+        verbose (bool): Whether or not to output the log by tqdm
+        confidence (float): Confidence level of the intervals
+
+    Returns:
+            pd.DataFrame: word, the scaled word_count, word_count_lower, word_count_upper
+                          and the raw sample_word_count
+
+    """
+    sums = defaultdict(lambda: defaultdict(int))
+    squares = defaultdict(lambda: defaultdict(int))
+    for sent, label in zip(tqdm(df_value) if verbose else df_value, sample_strata.tolist()):
+        stratum_sums, stratum_squares = sums[label], squares[label]
+        for word, count in Counter(_generate_ngrams(str(sent), n_gram=n_gram, stopwords=stopwords)).items():
+            stratum_sums[word] += count
+            stratum_squares[word] += count * count
+
+    labels, sample_sizes = np.unique(sample_strata, return_counts=True)
+    sample_sizes = dict(zip(labels.tolist(), sample_sizes.tolist()))
+
+    total = defaultdict(float)
+    sample_count = defaultdict(int)
+    for label, stratum_sums in sums.items():
+        weight = population_sizes[label] / sample_sizes[label]
+        for word, count in stratum_sums.items():
+            total[word] += weight * count
+            sample_count[word] += count
+    words = [word for word, _ in sorted(total.items(), key=lambda x: x[1], reverse=True)[:n]]
+
+    # variance of the estimated totals, only for the output words
+    variance = np.zeros(len(words))
+    for label, stratum_sums in sums.items():
+        n_population, n_sample = population_sizes[label], sample_sizes[label]
+        if n_sample < 2:
+            continue
+        stratum_squares = squares[label]
+        word_sums = np.array([stratum_sums.get(word, 0) for word in words], dtype=float)
+        word_squares = np.array([stratum_squares.get(word, 0) for word in words], dtype=float)
+        sample_var = (word_squares - word_sums ** 2 / n_sample) / (n_sample - 1)
+        variance += (n_population ** 2) * (1 - n_sample / n_population) * sample_var / n_sample
+
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    margin = z * np.sqrt(np.maximum(variance, 0))
+    estimate = np.array([total[word] for word in words])
+
+    fd = pd.DataFrame({'word': words})
+    fd['word_count'] = np.round(estimate).astype(int)
+    fd['sample_word_count'] = np.array([sample_count[word] for word in words], dtype=int)
+    fd['word_count_lower'] = np.round(np.maximum(estimate - margin, fd['sample_word_count'])).astype(int)
+    fd['word_count_upper'] = np.round(estimate + margin).astype(int)
+    return fd
+
+
+def _filter_tokens(tokens, mask):
+    """Keep the words of an Arrow list array where the mask over the flattened words is True"""
+    if isinstance(tokens, pa.ChunkedArray):
+        tokens = tokens.combine_chunks()
+    words = pc.list_flatten(tokens)
+    parents = pc.list_parent_indices(tokens)
+    lengths = np.bincount(parents.filter(mask).to_numpy(), minlength=len(tokens))
+    offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return pa.LargeListArray.from_arrays(pa.array(offsets), words.filter(mask))
+
+
+def _arrow_tokenize(values):
+    """Tokenize with Arrow kernels, returns None when the column cannot be converted by Arrow"""
+    try:
+        # Arrow infers the type of the whole column, not only of the first row
+        arr = pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+
+    if pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type):
+        tokens = pc.utf8_split_whitespace(arr.cast(pa.large_string()))
+        # drop the empty strings produced by leading/trailing whitespace, as str.split() does
+        tokens = _filter_tokens(tokens, pc.greater(pc.utf8_length(pc.list_flatten(tokens)), 0))
+    elif pa.types.is_list(arr.type) or pa.types.is_large_list(arr.type):
+        try:
+            tokens = arr.cast(pa.large_list(pa.large_string()))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+    else:
+        return None
+    return tokens
+
+
+def tokenize_series(values) -> tuple:
+    """Split the documents into word lists and count the words
+
+    With pyarrow installed, the documents are split by Arrow string kernels into a
+    list<string> Arrow array and the word counts are computed with list_value_length.
+    Otherwise, or if the column mixes strings and lists, each document is split by str.split().
+
+    Args:
+        values (pd.Series): list type or a string separated by a space values
+
+    Returns:
+            tuple: (pd.Series of word lists, np.ndarray of word counts)
+
+    """
+    if pa is not None and hasattr(pd, 'ArrowDtype'):
+        tokens = _arrow_tokenize(values)
+        if tokens is not None:
+            lengths = pc.list_value_length(tokens).to_numpy(zero_copy_only=False)
+            series = pd.Series(pd.arrays.ArrowExtensionArray(tokens), index=values.index, name=values.name)
+            return series, lengths
+
+    series = values.map(lambda x: x if type(x) is list else x.split())
+    lengths = series.map(len).to_numpy(dtype=np.int64)
+    return series, lengths
+
+
+def _arrow_list_array(values):
+    """Arrow list array of a pd.ArrowDtype column of word lists, None for the other dtypes"""
+    if pa is None or not hasattr(pd, 'ArrowDtype') or not isinstance(values.dtype, pd.ArrowDtype):
+        return None
+    tokens = pa.array(values.array)
+    if isinstance(tokens, pa.ChunkedArray):
+        tokens = tokens.combine_chunks()
+    if not (pa.types.is_list(tokens.type) or pa.types.is_large_list(tokens.type)):
+        return None
+    return tokens
+
+
+def _bar_ngram_figure(fd, title=None, xaxis_label='', yaxis_label='',
+                      width=800, height=1100, color=None, horizon=True) -> px.bar:
+    """Plot the n-gram bar chart of a data frame of frequent word, with error bars if it was sampled"""
+    fd = fd.copy()
+    error, error_minus = None, None
+    if 'word_count_lower' in fd.columns:
+        fd['error'] = fd['word_count_upper'] - fd['word_count']
+        fd['error_minus'] = fd['word_count'] - fd['word_count_lower']
+        error, error_minus = 'error', 'error_minus'
+
+    if horizon:
+        fig = px.bar(
+            fd.sort_values('word_count'),
+            y='word',
+            x='word_count',
+            text='word_count',
+            error_x=error,
+            error_x_minus=error_minus,
+            orientation='h',)
+    else:
+        fig = px.bar(
+            fd,
+            y='word_count',
+            x='word',
+            text='word_count',
+            error_y=error,
+            error_y_minus=error_minus,)
+
+    fig.update_traces(
+        texttemplate='%{text:.2s}',
+        textposition='auto',
+        marker_color=color,)
+    fig.update_layout(
+        title=str(title),
+        xaxis_title=str(xaxis_label),
+        yaxis_title=str(yaxis_label),
+        width=width,
+        height=height,)
+    return fig
+
+
+def _dict_to_array(values, size) -> np.ndarray:
+    """Convert a dictionary of node code and value into an array indexed by node code"""
+    array = np.zeros(size)
+    array[np.fromiter(values.keys(), dtype=np.int64, count=len(values))] = \
+        np.fromiter(values.values(), dtype=float, count=len(values))
+    return array
+
+
+def _get_n_jobs(n_jobs) -> int:
+    """Resolve the number of worker processes (-1 means all cores)"""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(multiprocessing.cpu_count() + 1 + n_jobs, 1)
+    return max(n_jobs, 1)
+
+
+# graph shared with the metric workers (set by the pool initializer)
+_worker_graph = None
+
+
+def _init_graph_worker(G):
+    global _worker_graph
+    _worker_graph = G
+
+
+def _betweenness_centrality_subset(sources) -> dict:
+    """Unnormalized betweenness centrality accumulated over shortest paths starting at sources"""
+    return nx.betweenness_centrality_subset(_worker_graph, sources, list(_worker_graph.nodes), normalized=False)
+
+
+def _clustering() -> dict:
+    return nx.clustering(_worker_graph)
+
+
+def _greedy_modularity_communities() -> list:
+    return community.greedy_modularity_communities(_worker_graph)
+
+
+def parallel_graph_metrics(G, n_jobs=-1) -> tuple:
+    """Calculate betweenness centrality, clustering coefficient and communities in a process pool
+
+    The three metrics are independent of each other and are submitted concurrently.
+    Betweenness centrality is further split into partitions of source nodes,
+    and the partial results are summed and normalized as nx.betweenness_centrality does.
+
+    Args:
+        G (nx.Graph): Networkx graph
+        n_jobs (int): Number of worker processes. -1 means using all processors.
+
+    Returns:
+            tuple: (betweenness centrality dict, clustering coefficient dict, list of communities)
+
+    """
+    n_jobs = _get_n_jobs(n_jobs)
+    nodes = list(G.nodes)
+    n_nodes = len(nodes)
+
+    # strided partitions balance the cost of high- and low-degree sources
+    partitions = [nodes[i::n_jobs] for i in range(n_jobs) if nodes[i::n_jobs]]
+
+    # the graph is sent once to each worker, the tasks only carry the source partitions
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_graph_worker, initargs=(G,)) as executor:
+        clustering_future = executor.submit(_clustering)
+        communities_future = executor.submit(_greedy_modularity_communities)
+        betweenness_futures = [executor.submit(_betweenness_centrality_subset, partition)
+                               for partition in partitions]
+
+        betweenness = dict.fromkeys(nodes, 0.0)
+        for future in betweenness_futures:
+            for node, value in future.result().items():
+                betweenness[node] += value
+        clustering_coeff = clustering_future.result()
+        communities = communities_future.result()
+
+    # same scaling as nx.betweenness_centrality(G, normalized=True) for undirected graphs
+    if n_nodes > 2:
+        scale = 2.0 / ((n_nodes - 1) * (n_nodes - 2))
+        betweenness = {node: value * scale for node, value in betweenness.items()}
+
+    return betweenness, clustering_coeff, communities
+
+
+class TokenCorpus():
+    """Memory-mapped on-disk token corpus
+
+    The corpus directory consists of the following files.
+        vocab.npy: UTF-8 bytes of all words concatenated (uint8)
+        vocab_offsets.npy: start position of each word in vocab.npy, followed by the total length (int64)
+        token_ids.npy: token ids of all documents concatenated (int32)
+        offsets.npy: start position of each document in token_ids, followed by the total length (int64)
+
+    The arrays are opened with np.memmap, so loading is almost instantaneous
+    and the pages are shared between processes that open the same corpus.
+
+    Attributes:
+        path (str): corpus directory
+        vocab (np.ndarray): array of words indexed by token id
+        token_ids (np.memmap): token ids of all documents
+        offsets (np.memmap): document boundaries in token_ids
+
+    """
+
+    VOCAB_FILE_NAME = 'vocab.npy'
+    VOCAB_OFFSETS_FILE_NAME = 'vocab_offsets.npy'
+    TOKEN_IDS_FILE_NAME = 'token_ids.npy'
+    OFFSETS_FILE_NAME = 'offsets.npy'
+
+    def __init__(self, path, mmap_mode='r'):
+        """init"""
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.vocab = self._load_vocab(path)
+        self.token_ids = np.load(os.path.join(path, self.TOKEN_IDS_FILE_NAME), mmap_mode=mmap_mode)
+        self.offsets = np.load(os.path.join(path, self.OFFSETS_FILE_NAME), mmap_mode=mmap_mode)
+
+    @classmethod
+    def _load_vocab(cls, path) -> np.ndarray:
+        """Decode the variable-length words, the index is the token id"""
+        data = np.load(os.path.join(path, cls.VOCAB_FILE_NAME)).tobytes()
+        offsets = np.load(os.path.join(path, cls.VOCAB_OFFSETS_FILE_NAME)).tolist()
+        vocab = np.empty(len(offsets) - 1, dtype=object)
+        vocab[:] = [data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+        return vocab
+
+    def __reduce__(self):
+        # re-open the files in worker processes instead of copying the arrays
+        return (self.__class__, (self.path, self.mmap_mode))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> list:
+        return self.vocab[self.token_ids[self.offsets[i]:self.offsets[i + 1]]].tolist()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lengths(self) -> np.ndarray:
+        """Number of tokens in each document"""
+        return np.diff(self.offsets)
+
+    def word_counts(self) -> pd.Series:
+        """Number of occurrences of each word"""
+        counts = np.bincount(self.token_ids, minlength=len(self.vocab))
+        return pd.Series(counts, index=self.vocab)
+
+
+def save_corpus(df, taget_col, path) -> None:
+    """Convert a data frame into the on-disk token corpus format
+
+    Args:
+        df (pd.DataFrame): data frame to be converted
+        taget_col (str): Columns to be converted (list type or a string separated by a space)
+        path (str): corpus directory to be written
+
+    Returns:
+        None
+
+    """
+    docs, lengths = tokenize_series(df[taget_col].dropna())
+    tokens = _arrow_list_array(docs)
+
+    # null words inside the lists are dropped, so that the offsets match the token ids
+    if tokens is not None:
+        tokens = _filter_tokens(tokens, pc.is_valid(pc.list_flatten(tokens)))
+        lengths = pc.list_value_length(tokens).to_numpy(zero_copy_only=False)
+        encoded = pc.list_flatten(tokens).dictionary_encode()
+        token_ids = encoded.indices.to_numpy(zero_copy_only=False)
+        vocab = encoded.dictionary.to_pylist()
+    else:
+        docs = docs.map(lambda x: [word for word in x if pd.notna(word)])
+        lengths = docs.map(len).to_numpy(dtype=np.int64)
+        # empty documents become NaN when exploded
+        token_ids, vocab = pd.factorize(docs.explode().dropna())
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # the vocabulary is stored as variable-length UTF-8 bytes, so a long word does not pad the others
+    # and words may contain any character
+    encoded_vocab = [str(word).encode('utf-8') for word in vocab]
+    vocab_offsets = np.zeros(len(encoded_vocab) + 1, dtype=np.int64)
+    np.cumsum([len(word) for word in encoded_vocab], out=vocab_offsets[1:])
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, TokenCorpus.VOCAB_FILE_NAME), np.frombuffer(b''.join(encoded_vocab), dtype=np.uint8))
+    np.save(os.path.join(path, TokenCorpus.VOCAB_OFFSETS_FILE_NAME), vocab_offsets)
+    np.save(os.path.join(path, TokenCorpus.TOKEN_IDS_FILE_NAME), token_ids.astype(np.int32))
+    np.save(os.path.join(path, TokenCorpus.OFFSETS_FILE_NAME), offsets)
+    return None
+
+
+def load_corpus(path, mmap_mode='r') -> TokenCorpus:
+    """Open the on-disk token corpus
+
+    Args:
+        path (str): corpus directory written by save_corpus
+        mmap_mode (str): mode of np.memmap
+
+    Returns:
+        TokenCorpus: memory-mapped token corpus
+
+    """
+    return TokenCorpus(path, mmap_mode=mmap_mode)
+
+
+def _safe_file_name(name) -> str:
+    """Replace the characters that are not allowed in a file name, such as path separators"""
+    name = re.sub(r'[^\w\-. ]', '_', str(name)).strip(' .')
+    return name or '_'
+
+
+def _render_figure(name, fig, output_dir, single_file) -> str:
+    """Serialize a figure of the report
+
+    Returns the path of the written file, or the HTML fragment if single_file is True.
+    """
+    # wordcloud image, embedded as a data URI in the single HTML file
+    if isinstance(fig, (np.ndarray, Image.Image)):
+        image = Image.fromarray(fig) if isinstance(fig, np.ndarray) else fig
+        if single_file:
+            stream = BytesIO()
+            image.save(stream, 'png')
+            return '<img src="data:image/png;base64,{}" alt="{}">'.format(
+                base64.b64encode(stream.getvalue()).decode('ascii'), html.escape(name))
+        filename = os.path.join(output_dir, name + '.png')
+        image.save(filename)
+        return filename
+
+    # pyLDAvis prepared data
+    if hasattr(fig, 'topic_coordinates'):
+        if single_file:
+            return pyLDAvis.prepared_data_to_html(fig)
+        filename = os.path.join(output_dir, name + '.html')
+        pyLDAvis.save_html(fig, filename)
+        return filename
+
+    # plotly figure, referring to the shared plotly.js
+    if single_file:
+        return pio.to_html(fig, include_plotlyjs=False, full_html=False)
+    filename = os.path.join(output_dir, name + '.html')
+    pio.write_html(fig, filename, include_plotlyjs=PLOTLYJS_FILE_NAME, auto_open=False)
+    return filename
+
+
+def export_report(figures, output_dir, single_file=False, title='report', n_jobs=1) -> list:
+    """Export a set of figures into one directory with a single local copy of plotly.js
+
+    Args:
+        figures (dict): Figure name and figure e.g. {'uni-gram': fig, 'wordcloud': img, 'ldavis': vis}.
+                        plotly figures, images (np.ndarray or PIL.Image) and pyLDAvis data are supported.
+                        Characters not allowed in a file name (e.g. '/') are replaced with '_'.
+        output_dir (str): Directory to save the report
+        single_file (bool): Whether or not to write all the figures into one HTML file
+        title (str): File name of the HTML file if single_file is True
+        n_jobs (int): Number of processes to serialize the figures. -1 means using all processors.
+
+    Returns:
+            list: List of the saved file paths
+
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    plotlyjs_path = os.path.join(output_dir, PLOTLYJS_FILE_NAME)
+    if not os.path.exists(plotlyjs_path):
+        with open(plotlyjs_path, 'w', encoding='utf-8') as f:
+            f.write(plotly.offline.get_plotlyjs())
+
+    names = list(figures)
+    file_names = [_safe_file_name(name) for name in names]
+    if len(set(file_names)) < len(file_names):
+        raise ValueError('figure names must be unique after sanitizing: {}'.format(file_names))
+
+    n_jobs = _get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        results = [_render_figure(file_name, figures[name], output_dir, single_file)
+                   for name, file_name in zip(names, file_names)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_render_figure, file_names, [figures[name] for name in names],
+                                        itertools.repeat(output_dir), itertools.repeat(single_file)))
+
+    if not single_file:
+        return results
+
+    body = '\n'.join('<h2>{}</h2>\n{}'.format(html.escape(name), fragment)
+                     for name, fragment in zip(names, results))
+    filename = os.path.join(output_dir, _safe_file_name(title) + '.html')
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<html>\n<head>\n<meta charset="utf-8">\n<title>{}</title>\n'
+                '<script src="{}"></script>\n</head>\n<body>\n{}\n</body>\n</html>\n'
+                .format(html.escape(str(title)), PLOTLYJS_FILE_NAME, body))
+    return [filename]
+
+
 class NLPlot():
     """Visualization Module for Natural Language Processing
 
     Attributes:
-        df (pd.DataFrame): Original data frame to be graphed
+        df (pd.DataFrame or TokenCorpus): Original data frame to be graphed, or a corpus opened by load_corpus
         taget_col: Columns to be analyzed that exist in df (assuming type list) e.g. [hoge, fuga, ...]
         output_file_path: path to save the html file of the generated graph
         default_stopwords_file_path: The path to the file that defines the default stopword
@@ -102,13 +639,19 @@ class NLPlot():
     def __init__(self, df, taget_col, output_file_path='./',
                  default_stopwords_file_path=''):
         """init"""
-        self.df = df
         self.taget_col = taget_col
-        self.df.dropna(subset=[self.taget_col], inplace=True)
-        if type(self.df[self.taget_col].iloc[0]) is not list:
-            self.df[self.taget_col] = self.df[self.taget_col].map(lambda x: x.split())
-        self.df[self.taget_col + '_length'] = self.df[self.taget_col].map(lambda x: len(x))
+        self.corpus = None
+        if isinstance(df, TokenCorpus):
+            # the tokens stay on disk, only the word count is kept in memory
+            self.corpus = df
+            self.df = pd.DataFrame({self.taget_col + '_length': self.corpus.lengths()})
+        else:
+            self.df = df
+            self.df.dropna(subset=[self.taget_col], inplace=True)
+            # the column becomes pd.ArrowDtype when pyarrow is available
+            self.df[self.taget_col], self.df[self.taget_col + '_length'] = tokenize_series(self.df[self.taget_col])
         self.output_file_path = output_file_path
+        self.sample_report = None
         self.default_stopwords = []
         if os.path.exists(default_stopwords_file_path):
             f = open(default_stopwords_file_path)
@@ -116,6 +659,72 @@ class NLPlot():
             f.close()
             self.default_stopwords = [line.strip() for line in txt_file]
 
+    def documents(self, positions=None):
+        """Word lists of each document, from the data frame or the on-disk corpus"""
+        if self.corpus is not None:
+            if positions is not None:
+                return [self.corpus[i] for i in positions]
+            return self.corpus
+        if positions is not None:
+            return self.df[self.taget_col].iloc[positions]
+        return self.df[self.taget_col]
+
+    def joined_documents(self, positions=None):
+        """Space-separated text of each document"""
+        docs = self.documents(positions)
+        tokens = None if self.corpus is not None else _arrow_list_array(docs)
+        if tokens is not None:
+            joined = pc.binary_join(tokens, pa.scalar(' ', tokens.type.value_type))
+            return joined.to_numpy(zero_copy_only=False)
+        return [' '.join(doc) for doc in docs]
+
+    def sample_documents(self, sample=None, random_state=0, stratify=None) -> tuple:
+        """Sample the documents for a fast preview
+
+        The sample size used is stored in self.sample_report.
+
+        Args:
+            sample (int or float): Number of documents to sample, or the fraction if it is a float.
+                                   None uses all documents.
+            random_state (int): Seed of the random sampling
+            stratify (str): Column of df used for the stratified sampling.
+                            Missing values form a stratum of their own.
+                            Not available with a TokenCorpus input.
+
+        Returns:
+            tuple: (positions of the sampled documents, stratum code of each sampled document,
+                    number of documents in the corpus for each stratum code), or (None, None, None) without sample
+
+        """
+        if sample is None:
+            self.sample_report = None
+            return None, None, None
+
+        n_docs = len(self.df)
+        if stratify is not None and self.corpus is not None:
+            raise ValueError('stratified sampling needs a DataFrame input, '
+                             'the corpus opened by load_corpus has no column {!r}'.format(stratify))
+        if stratify is None:
+            strata = np.zeros(n_docs, dtype=int)
+        else:
+            # NaN labels are factorized to -1 and kept as a stratum
+            strata, _ = pd.factorize(self.df[stratify])
+        positions = sample_positions(n_docs, sample, random_state=random_state,
+                                     strata=None if stratify is None else strata)
+        sample_strata = strata[positions]
+        codes, counts = np.unique(strata, return_counts=True)
+        population_sizes = dict(zip(codes.tolist(), counts.tolist()))
+
+        self.sample_report = {
+            'sample_size': len(positions),
+            'population_size': n_docs,
+            'fraction': len(positions) / max(n_docs, 1),
+            'random_state': random_state,
+            'stratify': stratify,
+        }
+        print('sample_size:{}, population_size:{}'.format(len(positions), n_docs))
+        return positions, sample_strata, population_sizes
+
     def get_stopword(self, top_n=10, min_freq=5) -> list:
         """Calculate the stop word.
 
@@ -133,9 +742,16 @@ class NLPlot():
         fdist = Counter()
 
         # Count the number of occurrences per word.
-        for doc in self.df[self.taget_col]:
-            for word in doc:
-                fdist[word] += 1
+        tokens = None if self.corpus is not None else _arrow_list_array(self.df[self.taget_col])
+        if self.corpus is not None:
+            fdist.update(self.corpus.word_counts().to_dict())
+        elif tokens is not None:
+            counts = pc.value_counts(pc.list_flatten(tokens))
+            fdist.update(dict(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist())))
+        else:
+            for doc in self.documents():
+                for word in doc:
+                    fdist[word] += 1
         # word with a high frequency
         common_words = {word for word, freq in fdist.most_common(top_n)}
         # word with a low frequency
@@ -143,10 +759,46 @@ class NLPlot():
         stopwords = list(common_words.union(rare_words))
         return stopwords
 
+    def ngram_freq(self, ngram=1, top_n=50, stopwords=[], verbose=True,
+                   sample=None, random_state=0, stratify=None) -> pd.DataFrame:
+        """Count the n-grams of the documents
+
+        Args:
+            ngram (int): N number of N grams
+            top_n (int): How many words should be output
+            stopwords (list): A list of words to specify for the stopword.
+            verbose (bool): Whether or not to output the log by tqdm
+            sample (int or float): Number of documents to sample for a fast preview,
+                                   or the fraction if it is a float. None uses all documents.
+            random_state (int): Seed of the random sampling
+            stratify (str): Column of df used for the stratified sampling
+
+        Returns:
+            pd.DataFrame: word and word_count, plus word_count_lower, word_count_upper
+                          and sample_word_count with sample
+
+        """
+
+        stopwords += self.default_stopwords
+
+        positions, sample_strata, population_sizes = self.sample_documents(sample, random_state, stratify)
+        space = pd.Series(self.joined_documents(positions))
+
+        # word count
+        if positions is None:
+            _df = freq_df(space, n_gram=ngram, n=top_n,
+                          stopwords=stopwords, verbose=verbose)
+        else:
+            # scale the counts of the sample to the corpus size with confidence intervals
+            _df = sample_freq_df(space, sample_strata, population_sizes, n_gram=ngram, n=top_n,
+                                 stopwords=stopwords, verbose=verbose)
+        return _df
+
     def bar_ngram(self, title=None,
                   xaxis_label='', yaxis_label='',
                   ngram=1, top_n=50, width=800, height=1100,
-                  color=None, horizon=True, stopwords=[], verbose=True, save=False) -> px.bar:
+                  color=None, horizon=True, stopwords=[], verbose=True, save=False,
+                  sample=None, random_state=0, stratify=None) -> px.bar:
         """Plots of n-gram bar chart
 
         Args:
@@ -162,45 +814,22 @@ class NLPlot():
             stopwords (list): A list of words to specify for the stopword.
             verbose (bool): Whether or not to output the log by tqdm
             save (bool): Whether or not to save the HTML file.
+            sample (int or float): Number of documents to sample for a fast preview,
+                                   or the fraction if it is a float. None uses all documents.
+            random_state (int): Seed of the random sampling
+            stratify (str): Column of df used for the stratified sampling
 
         Returns:
             px.bar: Figure of a bar graph
 
         """
 
-        stopwords += self.default_stopwords
-
-        _df = self.df.copy()
-        _df['space'] = self.df[self.taget_col].apply(lambda x: ' '.join(x))
-
         # word count
-        _df = freq_df(_df['space'], n_gram=ngram, n=top_n,
-                      stopwords=stopwords, verbose=verbose)
-
-        if horizon:
-            fig = px.bar(
-                _df.sort_values('word_count'),
-                y='word',
-                x='word_count',
-                text='word_count',
-                orientation='h',)
-        else:
-            fig = px.bar(
-                _df,
-                y='word_count',
-                x='word',
-                text='word_count',)
-
-        fig.update_traces(
-            texttemplate='%{text:.2s}',
-            textposition='auto',
-            marker_color=color,)
-        fig.update_layout(
-            title=str(title),
-            xaxis_title=str(xaxis_label),
-            yaxis_title=str(yaxis_label),
-            width=width,
-            height=height,)
+        _df = self.ngram_freq(ngram=ngram, top_n=top_n, stopwords=stopwords, verbose=verbose,
+                              sample=sample, random_state=random_state, stratify=stratify)
+
+        fig = _bar_ngram_figure(_df, title=title, xaxis_label=xaxis_label, yaxis_label=yaxis_label,
+                                width=width, height=height, color=color, horizon=horizon)
 
         if save:
             self.save_plot(fig, title)
@@ -210,7 +839,8 @@ class NLPlot():
         return fig
 
     def treemap(self, title=None, ngram=1, top_n=50,
-                width=1300, height=600, stopwords=[], verbose=True, save=False) -> px.treemap:
+                width=1300, height=600, stopwords=[], verbose=True, save=False,
+                sample=None, random_state=0, stratify=None) -> px.treemap:
         """Plots of Tree Map
 
         Args:
@@ -222,25 +852,25 @@ class NLPlot():
             stopwords (list): A list of words to specify for the stopword
             verbose (bool): Whether or not to output the log by tqdm
             save (bool): Whether or not to save the HTML file.
+            sample (int or float): Number of documents to sample for a fast preview,
+                                   or the fraction if it is a float. None uses all documents.
+            random_state (int): Seed of the random sampling
+            stratify (str): Column of df used for the stratified sampling
 
         Returns:
             px.treemap: Figure of a treemap graph
 
         """
 
-        stopwords += self.default_stopwords
-
-        _df = self.df.copy()
-        _df['space'] = self.df[self.taget_col].apply(lambda x: ' '.join(x))
-
         # word count
-        _df = freq_df(_df['space'], n_gram=ngram, n=top_n,
-                      stopwords=stopwords, verbose=verbose)
+        _df = self.ngram_freq(ngram=ngram, top_n=top_n, stopwords=stopwords, verbose=verbose,
+                              sample=sample, random_state=random_state, stratify=stratify)
 
         fig = px.treemap(
             _df,
             path=['word'],
             values='word_count',
+            hover_data=['word_count_lower', 'word_count_upper'] if sample is not None else None,
         )
         fig.update_layout(
             title=str(title),
@@ -296,7 +926,8 @@ class NLPlot():
 
     def wordcloud(self, width=800, height=500,
                   max_words=100, max_font_size=80, stopwords=[],
-                  colormap=None, mask_file=None, save=False) -> None:
+                  colormap=None, mask_file=None, save=False,
+                  sample=None, random_state=0, stratify=None, show=True) -> np.ndarray:
         """Plots of WordCloud
 
         Args:
@@ -308,9 +939,14 @@ class NLPlot():
             colormap (str): cf.https://karupoimou.hatenablog.com/entry/2019/05/17/153207
             mask_file (str): Image to be masked file
             save (bool): Whether or not to save the Image file.
+            sample (int or float): Number of documents to sample for a fast preview,
+                                   or the fraction if it is a float. None uses all documents.
+            random_state (int): Seed of the random sampling
+            stratify (str): Column of df used for the stratified sampling
+            show (bool): Whether or not to display the image in the notebook.
 
         Returns:
-            None
+            np.ndarray: Image of the wordcloud if show is False, otherwise None
 
         """
 
@@ -320,8 +956,8 @@ class NLPlot():
         else:
             mask = None
 
-        _df = self.df.copy()
-        text = _df[self.taget_col]
+        positions, _, _ = self.sample_documents(sample, random_state, stratify)
+        text = self.documents(positions)
         stopwords += self.default_stopwords
 
         wordcloud = WordCloud(
@@ -340,30 +976,34 @@ class NLPlot():
                         collocations=False,
                         prefer_horizontal=1,
                         colormap=colormap)
-        wordcloud.generate(' '.join(list(itertools.chain(*list(text)))))
+        wordcloud.generate(' '.join(itertools.chain.from_iterable(text)))
 
         def show_array(img):
+            import IPython.display
             stream = BytesIO()
-            if save:
-                Image.fromarray(img).save('wordcloud.png')
             Image.fromarray(img).save(stream, 'png')
             IPython.display.display(IPython.display.
                                     Image(data=stream.getvalue()))
 
         img = wordcloud.to_array()
-        show_array(img)
+        if save:
+            date = str(pd.to_datetime(datetime.datetime.now())).split(' ')[0]
+            Image.fromarray(img).save(self.output_file_path + date + '_wordcloud.png')
 
-        del _df
         gc.collect()
-        return None
+        if show:
+            show_array(img)
+            return None
+        return img
 
-    def get_edges_nodes(self, batches, min_edge_frequency) -> None:
+    def get_edges_nodes(self, batches, min_edge_frequency, weights=None) -> None:
         """Generating the Edge and Node data frames for a graph
 
         Args:
             batches (list): array of word lists
             min_edge_frequency (int): Minimum number of edge occurrences.
                                       Edges less than this number will be removed.
+            weights (list): Weight of each word list when counting the edges (1 for all if None)
 
         Returns:
             None
@@ -383,41 +1023,50 @@ class NLPlot():
             """
             return list(itertools.combinations(_ranked_topics(batches), 2))
 
-        def _add_unique_combinations(_unique_combinations, _dict):
+        def _add_unique_combinations(_unique_combinations, _dict, weight=1):
             """Calculate how many times the combination appears and store it in a dictionary"""
             for combination in _unique_combinations:
                 if combination in _dict:
-                    _dict[combination] += 1
+                    _dict[combination] += weight
                 else:
-                    _dict[combination] = 1
+                    _dict[combination] = weight
             return _dict
 
         edge_dict = {}
-        source = []
-        target = []
-        edge_frequency = []
-        for batch in batches:
+        if weights is None:
+            weights = itertools.repeat(1)
+        for batch, weight in zip(batches, weights):
             # e.g. {('hoge1', 'hoge2'): 8, ('hoge1', 'hoge3'): 3, ...}
-            edge_dict = _add_unique_combinations(_unique_combinations(batch), edge_dict)
+            edge_dict = _add_unique_combinations(_unique_combinations(batch), edge_dict, weight)
+
+        # (source, target) pairs and their frequencies as arrays
+        n_edges = len(edge_dict)
+        pairs = np.array(list(edge_dict.keys()), dtype=object).reshape(n_edges, 2)
+        edge_frequency = np.fromiter(edge_dict.values(), dtype=float, count=n_edges)
+
+        # keep the frequent edges in descending order of frequency
+        keep = np.flatnonzero(edge_frequency > min_edge_frequency)
+        keep = keep[np.argsort(-edge_frequency[keep], kind='stable')]
+        pairs = pairs[keep]
+        edge_frequency = np.round(edge_frequency[keep]).astype(np.int64)
+
+        # factorize the words of both ends into node codes
+        codes, words = pd.factorize(pairs.ravel())
+        codes = codes.astype(np.int32).reshape(-1, 2)
 
         # create edge dataframe
-        for key, value in edge_dict.items():
-            source.append(key[0])
-            target.append(key[1])
-            edge_frequency.append(value)
-        edge_df = pd.DataFrame({'source': source, 'target': target, 'edge_frequency': edge_frequency})
-        edge_df.sort_values(by='edge_frequency', ascending=False, inplace=True)
-        edge_df.reset_index(drop=True, inplace=True)
-        edge_df = edge_df[edge_df['edge_frequency'] > min_edge_frequency]
+        edge_df = pd.DataFrame({
+            'source': pd.Categorical.from_codes(codes[:, 0], categories=words),
+            'target': pd.Categorical.from_codes(codes[:, 1], categories=words),
+            'edge_frequency': edge_frequency,
+            'source_code': codes[:, 0],
+            'target_code': codes[:, 1],
+        })
 
         # create node dataframe
-        node_df = pd.DataFrame({'id': list(set(list(edge_df['source']) + list(edge_df['target'])))})
-        labels = [i for i in range(len(node_df['id']))]
-        node_df['id_code'] = node_df.index
-        node_dict = dict(zip(node_df['id'], labels))
-
-        edge_df['source_code'] = edge_df['source'].apply(lambda x: node_dict[x])
-        edge_df['target_code'] = edge_df['target'].apply(lambda x: node_dict[x])
+        node_df = pd.DataFrame({'id': np.asarray(words, dtype=object),
+                                'id_code': np.arange(len(words), dtype=np.int32)})
+        node_dict = dict(zip(node_df['id'], range(len(words))))
 
         self.edge_df = edge_df
         self.node_df = node_df
@@ -433,42 +1082,46 @@ class NLPlot():
             nx.Graph(): Networkx graph
         """
 
-        def _extract_edges(edge_df):
-            tuple_out = []
-            for i in range(0, len(self.edge_df.index)):
-                tuple_out.append((self.edge_df['source_code'][i], self.edge_df['target_code'][i]))
-            return tuple_out
-
         # Networkx graph
         G = nx.Graph()
 
         # Add Node from Data Frame
-        G.add_nodes_from(self.node_df.id_code)
+        G.add_nodes_from(self.node_df['id_code'].tolist())
 
-        # Add Edge from Data Frame
-        # e.g. [(8, 47), (4, 47), (47, 0), ...]
-        edge_tuples = _extract_edges(self.edge_df)
-        for i in edge_tuples:
-            G.add_edge(i[0], i[1])
+        # Add Edge from Data Frame with the edge frequency as the weight
+        # e.g. [[8, 47, 30], [4, 47, 25], [47, 0, 21], ...]
+        edges = np.column_stack([self.edge_df['source_code'].to_numpy(),
+                                 self.edge_df['target_code'].to_numpy(),
+                                 self.edge_df['edge_frequency'].to_numpy()])
+        G.add_weighted_edges_from(edges.tolist(), weight='edge_frequency')
 
         return G
 
-    def build_graph(self, stopwords=[], min_edge_frequency=10) -> None:
+    def build_graph(self, stopwords=[], min_edge_frequency=10, n_jobs=1,
+                    sample=None, random_state=0, stratify=None) -> None:
         """Preprocessing to output a co-occurrence network
 
         Args:
             stopwords (list): List of words to exclude
             min_edge_frequency (int): Minimum number of edge occurrences (edges with fewer than this number are excluded)
+            n_jobs (int): Number of processes used to calculate the graph metrics.
+                          1 runs them sequentially, -1 means using all processors.
+            sample (int or float): Number of documents to sample for a fast preview,
+                                   or the fraction if it is a float. None uses all documents.
+                                   The edge frequencies are scaled to the corpus size.
+            random_state (int): Seed of the random sampling
+            stratify (str): Column of df used for the stratified sampling
 
         Returns:
             None
 
         """
 
-        self.df_edit = self.df.copy()
+        positions, sample_strata, population_sizes = self.sample_documents(sample, random_state, stratify)
+        self.df_edit = self.df.copy() if positions is None else self.df.iloc[positions].copy()
 
         # Remove duplicates from the list to be analyzed
-        self.df_edit[self.taget_col] = self.df_edit[self.taget_col].map(lambda x: list(set(x)))
+        self.df_edit[self.taget_col] = [list(set(x)) for x in self.documents(positions)]
 
         # Acquire only the column data for this analysis.
         self.target = self.df_edit[[self.taget_col]]
@@ -490,34 +1143,47 @@ class NLPlot():
         batches = batch.values.tolist()
 
         # Generating the Edge and Node data frames for a graph
-        self.get_edges_nodes(batches, min_edge_frequency)
-
-        # create adjacency, centrality, cluster
+        if positions is None:
+            self.get_edges_nodes(batches, min_edge_frequency)
+        else:
+            # each sampled document counts for N_h / n_h documents of its stratum,
+            # so the threshold is applied to the edge frequencies scaled to the corpus size
+            codes, sample_sizes = np.unique(sample_strata, return_counts=True)
+            stratum_weights = {code: population_sizes[code] / n for code, n in zip(codes.tolist(), sample_sizes)}
+            weights = [stratum_weights[code] for code in sample_strata.tolist()]
+            self.get_edges_nodes(batches, min_edge_frequency, weights=weights)
+
+        # create adjacency, centrality, cluster, community
         # https://networkx.github.io/documentation/stable/reference/classes/generated/networkx.Graph.adjacency.html?highlight=adjacency#networkx.Graph.adjacency
         # https://networkx.github.io/documentation/networkx-1.10/reference/generated/networkx.algorithms.centrality.betweenness_centrality.html#betweenness-centrality
         # https://networkx.github.io/documentation/networkx-1.10/reference/generated/networkx.algorithms.cluster.clustering.html?highlight=clustering#clustering
+        # https://networkx.github.io/documentation/stable/reference/algorithms/community.html#module-networkx.algorithms.community.modularity_max
         self.G = self.get_graph()
         self.adjacencies = dict(self.G.adjacency())
-        self.betweeness = nx.betweenness_centrality(self.G)
-        self.clustering_coeff = nx.clustering(self.G)
-        self.node_df['adjacency_frequency'] = self.node_df['id_code'].map(lambda x: len(self.adjacencies[x]))
-        self.node_df['betweeness_centrality'] = self.node_df['id_code'].map(lambda x: self.betweeness[x])
-        self.node_df['clustering_coefficient'] = self.node_df['id_code'].map(lambda x: self.clustering_coeff[x])
+        if _get_n_jobs(n_jobs) == 1:
+            self.betweeness = nx.betweenness_centrality(self.G)
+            self.clustering_coeff = nx.clustering(self.G)
+            self.communities = community.greedy_modularity_communities(self.G)
+        else:
+            self.betweeness, self.clustering_coeff, self.communities = \
+                parallel_graph_metrics(self.G, n_jobs=n_jobs)
+        n_nodes = len(self.node_df)
+        id_code = self.node_df['id_code'].to_numpy()
+
+        # the edges are unique pairs without self loops, so the degree is the number of ends
+        degree = np.bincount(np.concatenate([self.edge_df['source_code'].to_numpy(),
+                                             self.edge_df['target_code'].to_numpy()]), minlength=n_nodes)
+        self.node_df['adjacency_frequency'] = degree[id_code]
+        self.node_df['betweeness_centrality'] = _dict_to_array(self.betweeness, n_nodes)[id_code]
+        self.node_df['clustering_coefficient'] = _dict_to_array(self.clustering_coeff, n_nodes)[id_code]
 
         # create community
-        # https://networkx.github.io/documentation/stable/reference/algorithms/community.html#module-networkx.algorithms.community.modularity_max
-        self.communities = community.greedy_modularity_communities(self.G)
-        self.communities_dict = {}
-        nodes_in_community = [list(i) for i in self.communities]
-        for i in nodes_in_community:
-            self.communities_dict[nodes_in_community.index(i)] = i
+        self.communities_dict = {k: list(nodes) for k, nodes in enumerate(self.communities)}
+        community_labels = np.full(n_nodes, -1, dtype=np.int32)
+        for k, nodes in self.communities_dict.items():
+            community_labels[nodes] = k
 
-        def community_allocation(source_val):
-            for k, v in self.communities_dict.items():
-                if source_val in v:
-                    return k
-
-        self.node_df['community'] = self.node_df['id_code'].map(lambda x: community_allocation(x))
+        self.node_df['community'] = community_labels[id_code]
 
         print('node_size:{}, edge_size:{}'.format(self.node_df.shape[0], self.edge_df.shape[0]))
 
@@ -525,7 +1191,7 @@ class NLPlot():
 
     def co_network(self, title, sizing=100, node_size='adjacency_frequency',
                    color_palette='hls', layout=nx.kamada_kawai_layout,
-                   light_theme=True, width=1700, height=1200, save=False) -> None:
+                   light_theme=True, width=1700, height=1200, save=False, show=True) -> go.Figure:
         """Plots of co-occurrence networks
 
         Args:
@@ -538,9 +1204,10 @@ class NLPlot():
             width (int): width of the graph
             height (int): height of the graph
             save (bool): Whether or not to save the HTML file.
+            show (bool): Whether or not to display the figure in the notebook.
 
         Returns:
-            None
+            go.Figure: Figure of a co-occurrence network if show is False, otherwise None
 
         """
 
@@ -649,14 +1316,18 @@ class NLPlot():
                           plot_bgcolor=back_col,  # set background color
                           )
         }
-        iplot(fig)
+        fig = go.Figure(fig)
+        if show:
+            iplot(fig)
 
         if save:
             self.save_plot(fig, title)
 
         del _df
         gc.collect()
-        return None
+        if show:
+            return None
+        return fig
 
     def sunburst(self, title, colorscale=False, color_col='betweeness_centrality',
                  color_continuous_scale='Oryel', width=1100, height=1100, save=False) -> px.sunburst:
@@ -723,8 +1394,8 @@ class NLPlot():
         workers = multiprocessing.cpu_count()
         workers = workers if workers == 1 else int(workers/2)
 
-        dic = gensim.corpora.Dictionary(self.df[self.taget_col])
-        bow_corpus = [dic.doc2bow(doc) for doc in self.df[self.taget_col]]
+        dic = gensim.corpora.Dictionary(self.documents())
+        bow_corpus = [dic.doc2bow(doc) for doc in self.documents()]
 
         # cf. https://radimrehurek.com/gensim/models/ldamodel.html
         lda_model = gensim.models.LdaMulticore(bow_corpus,
@@ -739,7 +1410,7 @@ class NLPlot():
         if save:
             date = str(pd.to_datetime(datetime.datetime.now())).split(' ')[0]
             filename = date + '_' + 'pyldavis.html'
-            pyLDAvis.save_html(vis, filename)
+            pyLDAvis.save_html(vis, self.output_file_path + filename)
 
         return vis
 
@@ -760,14 +1431,37 @@ class NLPlot():
         plotly.offline.plot(fig, filename=filename, auto_open=False)
         return None
 
+    def save_report(self, figures, title='report', single_file=False, n_jobs=1) -> list:
+        """Save a set of figures into one report directory sharing plotly.js
+
+        Args:
+            figures (dict): Figure name and figure e.g. {'uni-gram': fig, 'wordcloud': img, 'ldavis': vis}
+            title (str): Directory name to save. Characters not allowed in a file name (e.g. '/') are replaced with '_'.
+            single_file (bool): Whether or not to write all the figures into one HTML file
+            n_jobs (int): Number of processes to serialize the figures. -1 means using all processors.
+
+        Returns:
+            list: List of the saved file paths
+
+        """
+        date = str(pd.to_datetime(datetime.datetime.now())).split(' ')[0]
+        output_dir = self.output_file_path + date + '_' + _safe_file_name(title)
+        return export_report(figures, output_dir, single_file=single_file, title=title, n_jobs=n_jobs)
+
     def save_tables(self) -> None:
         """Storing a data frame"""
 
         date = str(pd.to_datetime(datetime.datetime.now())).split(' ')[0]
-        self.node_df.to_csv(date + "_node_df_" + self.source + ".csv", index=False)
+        self.node_df.to_csv(self.output_file_path + date + "_node_df.csv", index=False)
         print('Saved nodes')
-        self.edge_df.to_csv(date + "_edge_df_" + self.source + ".csv", index=False)
+        self.edge_df.to_csv(self.output_file_path + date + "_edge_df.csv", index=False)
         print('Saved edges')
-        self.df.to_csv(date + "_df_" + self.source + "_.csv", index=False)
+        df = self.df
+        tokens = _arrow_list_array(df[self.taget_col]) if self.taget_col in df.columns else None
+        if tokens is not None:
+            # write the Arrow word lists as python lists, which can be read back by ast.literal_eval
+            df = df.copy()
+            df[self.taget_col] = pd.Series(tokens.to_pylist(), index=df.index, dtype=object)
+        df.to_csv(self.output_file_path + date + "_df.csv", index=False)
         print('Saved unedited dataframe')
         return None
@@ -26,5 +26,6 @@ setup(
     install_requires=read_requirements(),
     packages=find_packages(exclude=('tests')),
     package_data={'nlplot':['data/*']},
+    entry_points={'console_scripts': ['nlplot=nlplot.cli:main']},
     python_requires='~=3.6'
 )
\ No newline at end of file